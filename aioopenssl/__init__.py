@@ -24,7 +24,7 @@ The following function can be used to create a connection using the
 
 The transport implementation is documented below:
 
-.. autoclass:: STARTTLSTransport(loop, rawsock, protocol, ssl_context_factory, [waiter=None], [use_starttls=False], [post_handshake_callback=None], [peer_hostname=None], [server_hostname=None])
+.. autoclass:: STARTTLSTransport(loop, rawsock, protocol, ssl_context_factory, [waiter=None], [use_starttls=False], [post_handshake_callback=None], [peer_hostname=None], [server_hostname=None], [send_records=1], [read_budget=None], [read_budget_calls=None], [coalesce_reads=False], [recv_size_min=None], [recv_size_max=None])
    :members:
 
 """
@@ -37,12 +37,17 @@ import typing
 from enum import Enum
 
 from .version import __version__, version_info, version  # noqa:F401
-from .utils import SendWrap
+from .utils import (
+    SendWrap, WriteQueue, RecvSizer, TLS_RECORD_SIZE, receive_buffer,
+)
 
 import OpenSSL.SSL
 
 logger = logging.getLogger(__name__)
 
+# asyncio.BufferedProtocol was added in Python 3.7
+_BufferedProtocol = getattr(asyncio, "BufferedProtocol", None)
+
 
 class _State(Enum):
     RAW_OPEN               = 0x0000  # noqa:E221
@@ -95,7 +100,9 @@ class STARTTLSTransport(asyncio.Transport):
 
     `rawsock` must be a :class:`socket.socket` which will be used as the socket
     for the transport. `protocol` must be a :class:`asyncio.Protocol` which
-    will be fed the data the transport receives.
+    will be fed the data the transport receives. On Python 3.7 and newer, it
+    may also be a :class:`asyncio.BufferedProtocol`; data is then received
+    directly into the buffers the protocol provides.
 
     `ssl_context_factory` must be a callable accepting a single positional
     argument which returns a :class:`OpenSSL.SSL.Context`. The transport will
@@ -144,9 +151,45 @@ class STARTTLSTransport(asyncio.Transport):
     e.g. using DANE. The coroutine must not return a value. If it encounters an
     error, an appropriate exception should be raised, which will propagate out
     of :meth:`starttls` and/or passed to the `waiter` future.
+
+    `send_records` is the number of TLS records worth of plaintext which is
+    passed to OpenSSL in a single send call. Only that much data is copied out
+    of the write buffer per send. Without TLS, up to :attr:`MAX_RAW_SEND_SIZE`
+    bytes are sent at once.
+
+    When the socket becomes readable, the transport keeps receiving until no
+    more data is available, but at most `read_budget` bytes (default:
+    :attr:`READ_BUDGET`) in at most `read_budget_calls` receive calls (default:
+    :attr:`READ_BUDGET_CALLS`). This prevents a single busy connection from
+    starving the others. Data which OpenSSL has already decrypted is read
+    in a later loop iteration if the budget is exhausted.
+
+    If `coalesce_reads` is true, the data received in one batch is passed to
+    :meth:`~asyncio.Protocol.data_received` in a single call. This has no
+    effect for :class:`asyncio.BufferedProtocol` instances.
+
+    The amount of data requested per receive call adapts to the amount of data
+    actually received: it grows while receives fill the buffer and shrinks
+    while they use only a small part of it. It is bounded by `recv_size_min`
+    (default: :attr:`MIN_RECV_SIZE`) and `recv_size_max` (default:
+    :attr:`MAX_SIZE`). For :class:`asyncio.BufferedProtocol` instances, the
+    current size is passed as hint to
+    :meth:`~asyncio.BufferedProtocol.get_buffer`.
+
+    .. versionchanged:: 0.6
+
+        The `send_records`, `read_budget`, `read_budget_calls`,
+        `coalesce_reads`, `recv_size_min` and `recv_size_max` arguments were
+        added.
     """
 
     MAX_SIZE = 256 * 1024
+    MIN_RECV_SIZE = 2048
+    INITIAL_RECV_SIZE = TLS_RECORD_SIZE
+    MAX_RAW_SEND_SIZE = 256 * 1024
+    DEFAULT_HIGH_WATER = 64 * 1024
+    READ_BUDGET = 256 * 1024
+    READ_BUDGET_CALLS = 16
 
     def __init__(
             self,
@@ -160,10 +203,18 @@ class STARTTLSTransport(asyncio.Transport):
                 PostHandshakeCallback
             ] = None,
             peer_hostname: typing.Optional[str] = None,
-            server_hostname: typing.Optional[str] = None):
+            server_hostname: typing.Optional[str] = None,
+            send_records: int = 1,
+            read_budget: typing.Optional[int] = None,
+            read_budget_calls: typing.Optional[int] = None,
+            coalesce_reads: bool = False,
+            recv_size_min: typing.Optional[int] = None,
+            recv_size_max: typing.Optional[int] = None):
         if not use_starttls and not ssl_context_factory:
             raise ValueError("Cannot have STARTTLS disabled (i.e. immediate "
                              "TLS connection) and without SSL context.")
+        if send_records < 1:
+            raise ValueError("send_records must be at least 1")
 
         super().__init__()
         self._rawsock = rawsock
@@ -172,15 +223,29 @@ class STARTTLSTransport(asyncio.Transport):
             "trace.fd={}".format(self._raw_fd)
         )
         self._sock = rawsock  # type: typing.Union[socket.socket, OpenSSL.SSL.Connection]  # noqa
-        self._send_wrap = SendWrap(self._sock)
+        self._send_wrap = SendWrap(self._sock,
+                                   max_size=self.MAX_RAW_SEND_SIZE)
+        self._send_records = send_records
+        self._read_budget = read_budget or self.READ_BUDGET
+        self._read_budget_calls = read_budget_calls or self.READ_BUDGET_CALLS
+        self._coalesce_reads = coalesce_reads
+        self._recv_sizer = RecvSizer(
+            recv_size_min or self.MIN_RECV_SIZE,
+            recv_size_max or self.MAX_SIZE,
+            initial=self.INITIAL_RECV_SIZE,
+        )
         self._protocol = protocol
+        self._buffered_protocol = (
+            _BufferedProtocol is not None and
+            isinstance(protocol, _BufferedProtocol)
+        )
         self._loop = loop
         self._extra = {
             "socket": rawsock,
         }  # type: typing.Dict[str, typing.Any]
         self._waiter = waiter
         self._conn_lost = 0
-        self._buffer = bytearray()
+        self._buffer = WriteQueue()
         self._ssl_context_factory = ssl_context_factory
         self._extra.update(
             sslcontext=None,
@@ -197,6 +262,11 @@ class STARTTLSTransport(asyncio.Transport):
         self._paused = False
         self._closing = False
 
+        self._protocol_paused = False
+        self._high_water = 0
+        self._low_water = 0
+        self._set_write_buffer_limits()
+
         self._tls_conn = None  # type: typing.Optional[OpenSSL.SSL.Connection]
         self._tls_read_wants_write = False
         self._tls_write_wants_read = False
@@ -337,7 +407,10 @@ class STARTTLSTransport(asyncio.Transport):
         except KeyError:
             pass
         self._sock = self._tls_conn
-        self._send_wrap = SendWrap(self._sock)
+        self._send_wrap = SendWrap(
+            self._sock,
+            max_size=self._send_records * TLS_RECORD_SIZE,
+        )
         self._extra.update(
             ssl_object=self._tls_conn
         )
@@ -425,7 +498,11 @@ class STARTTLSTransport(asyncio.Transport):
 
         self._state = _State.TLS_OPEN
 
-        self._loop.add_reader(self._raw_fd, self._read_ready)
+        if not self._paused:
+            self._loop.add_reader(self._raw_fd, self._read_ready)
+        if self._buffer:
+            # data written during the handshake
+            self._loop.add_writer(self._raw_fd, self._write_ready)
         if not self._tls_was_starttls:
             self._loop.call_soon(self._protocol.connection_made, self)
         if self._waiter is not None:
@@ -488,8 +565,102 @@ class STARTTLSTransport(asyncio.Transport):
             # no further reading
             return
 
+        if self._paused:
+            # the reader was only kept (or registered) for a pending write
+            if not self._tls_write_wants_read:
+                self._trace_logger.debug("_read_ready: paused, removing "
+                                         "reader")
+                self._loop.remove_reader(self._raw_fd)
+            return
+
+        coalesce = self._coalesce_reads and not self._buffered_protocol
+        budget = self._read_budget
+        calls = self._read_budget_calls
+        filled = 0
+        if coalesce:
+            coalesced = receive_buffer(budget)
+
+        sizer = self._recv_sizer
+        while True:
+            size = min(sizer.size, budget)
+            if self._buffered_protocol:
+                buf = self._get_protocol_buffer(size)
+                if buf is None:
+                    return
+                buf = buf[:size]
+            elif coalesce:
+                buf = coalesced[filled:filled+size]
+            else:
+                buf = receive_buffer(size)
+
+            nbytes = self._recv_into(buf)
+            if not nbytes:
+                break
+            sizer.update(nbytes)
+
+            budget -= nbytes
+            calls -= 1
+            if coalesce:
+                filled += nbytes
+            elif self._buffered_protocol:
+                self._protocol.buffer_updated(nbytes)  # type:ignore
+            else:
+                self._protocol.data_received(bytes(buf[:nbytes]))
+
+            if (budget <= 0 or calls <= 0 or
+                    self._state not in (_State.RAW_OPEN, _State.TLS_OPEN) or
+                    self._paused):
+                break
+
+            if not self._state.tls_started and nbytes < len(buf):
+                # the socket has been drained
+                break
+
+        if filled and self._state != _State.CLOSED:
+            self._protocol.data_received(bytes(coalesced[:filled]))
+
+        if nbytes == 0:
+            keep_open = False
+            try:
+                keep_open = bool(self._protocol.eof_received())
+            finally:
+                self._eof_received(keep_open)
+            return
+
+        if (self._state == _State.TLS_OPEN and not self._paused and
+                self._tls_conn is not None and self._tls_conn.pending()):
+            # the read budget is exhausted, but OpenSSL holds decrypted data
+            # for which the socket will not become readable
+            self._loop.call_soon(self._read_ready)
+
+    def _get_protocol_buffer(
+            self,
+            sizehint: int,
+            ) -> typing.Optional[memoryview]:
         try:
-            data = self._sock.recv(self.MAX_SIZE)
+            buf = self._protocol.get_buffer(sizehint)  # type:ignore
+            if not len(buf):
+                raise RuntimeError("get_buffer() returned an empty buffer")
+        except (SystemExit, KeyboardInterrupt):
+            raise
+        except BaseException as exc:
+            self._fatal_error(
+                exc,
+                "Fatal error: protocol.get_buffer() call failed.",
+            )
+            return None
+        return memoryview(buf)
+
+    def _recv_into(self, buf: memoryview) -> typing.Optional[int]:
+        """
+        Receive data into `buf`.
+
+        Return the number of bytes received, ``0`` on EOF and :data:`None` if
+        no data could be received.
+        """
+        assert self._state is not None
+        try:
+            return self._sock.recv_into(buf)
         except (BlockingIOError, InterruptedError, OpenSSL.SSL.WantReadError):
             pass
         except OpenSSL.SSL.WantWriteError:
@@ -512,64 +683,71 @@ class STARTTLSTransport(asyncio.Transport):
                                   "Fatal read error on STARTTLS transport")
         except Exception as err:
             self._fatal_error(err, "Fatal read error on STARTTLS transport")
-            return
-        else:
-            if data:
-                self._protocol.data_received(data)
-            else:
-                keep_open = False
-                try:
-                    keep_open = bool(self._protocol.eof_received())
-                finally:
-                    self._eof_received(keep_open)
+        return None
 
-    def _write_ready(self) -> None:
-        assert self._state is not None
-        if self._tls_read_wants_write:
-            self._tls_read_wants_write = False
-            self._read_ready()
-
-            if not self._paused and not self._state.eof_received:
-                self._trace_logger.debug("_write_ready: add reader for more"
-                                         " data")
-                self._loop.add_reader(self._raw_fd, self._read_ready)
+    def _send_buffered(self) -> bool:
+        """
+        Send data from the buffer until it is empty or the socket would block.
 
-        # do not send data during handshake!
-        if self._buffer and self._state != _State.TLS_HANDSHAKING:
+        Return :data:`False` if the transport was closed due to an error.
+        """
+        assert self._state is not None
+        while self._buffer:
             try:
-                nsent = self._send_wrap.send(self._buffer)
+                nsent = self._send_wrap.send(self._buffer.peek())
             except (BlockingIOError, InterruptedError,
                     OpenSSL.SSL.WantWriteError):
-                nsent = 0
+                break
             except OpenSSL.SSL.WantReadError:
-                nsent = 0
                 assert self._state.tls_started
                 self._tls_write_wants_read = True
                 self._trace_logger.debug(
-                    "_write_ready: swap writer for reader")
+                    "_send_buffered: swap writer for reader")
                 self._loop.remove_writer(self._raw_fd)
                 self._loop.add_reader(self._raw_fd, self._read_ready)
+                break
             except OpenSSL.SSL.SysCallError as exc:
                 if self._state in (_State.TLS_SHUT_DOWN,
                                    _State.TLS_SHUTTING_DOWN,
                                    _State.CLOSED):
                     self._trace_logger.debug(
-                        "_write_ready: ignoring syscall exception during "
+                        "_send_buffered: ignoring syscall exception during "
                         "shutdown: %s",
                         exc,
                     )
-                else:
-                    self._fatal_error(exc,
-                                      "Fatal write error on STARTTLS "
-                                      "transport")
+                    break
+                self._fatal_error(exc,
+                                  "Fatal write error on STARTTLS "
+                                  "transport")
+                return False
             except Exception as err:
                 self._fatal_error(err,
                                   "Fatal write error on STARTTLS "
                                   "transport")
-                return
+                return False
 
-            if nsent:
-                del self._buffer[:nsent]
+            if not nsent:
+                break
+            self._buffer.consume(nsent)
+
+        return True
+
+    def _write_ready(self) -> None:
+        assert self._state is not None
+        if self._tls_read_wants_write:
+            self._tls_read_wants_write = False
+            self._read_ready()
+
+            if not self._paused and not self._state.eof_received:
+                self._trace_logger.debug("_write_ready: add reader for more"
+                                         " data")
+                self._loop.add_reader(self._raw_fd, self._read_ready)
+
+        # do not send data during handshake!
+        if self._buffer and self._state != _State.TLS_HANDSHAKING:
+            if not self._send_buffered():
+                return
+            self._maybe_resume_protocol()
 
         if not self._buffer:
             if not self._tls_read_wants_write:
@@ -582,6 +760,63 @@ class STARTTLSTransport(asyncio.Transport):
                 else:
                     self._raw_shutdown()
 
+    def _maybe_pause_protocol(self) -> None:
+        if self._protocol_paused or len(self._buffer) <= self._high_water:
+            return
+
+        self._protocol_paused = True
+        try:
+            self._protocol.pause_writing()
+        except (SystemExit, KeyboardInterrupt):
+            raise
+        except BaseException as exc:
+            self._loop.call_exception_handler({
+                "message": "protocol.pause_writing() failed",
+                "exception": exc,
+                "transport": self,
+                "protocol": self._protocol,
+            })
+
+    def _maybe_resume_protocol(self) -> None:
+        if not self._protocol_paused or len(self._buffer) > self._low_water:
+            return
+
+        self._protocol_paused = False
+        try:
+            self._protocol.resume_writing()
+        except (SystemExit, KeyboardInterrupt):
+            raise
+        except BaseException as exc:
+            self._loop.call_exception_handler({
+                "message": "protocol.resume_writing() failed",
+                "exception": exc,
+                "transport": self,
+                "protocol": self._protocol,
+            })
+
+    def _set_write_buffer_limits(
+            self,
+            high: typing.Optional[int] = None,
+            low: typing.Optional[int] = None,
+            ) -> None:
+        if high is None:
+            if low is None:
+                high = self.DEFAULT_HIGH_WATER
+            else:
+                high = 4 * low
+        if low is None:
+            low = high // 4
+
+        if not high >= low >= 0:
+            raise ValueError(
+                "high ({!r}) must be >= low ({!r}) must be >= 0".format(
+                    high, low,
+                )
+            )
+
+        self._high_water = high
+        self._low_water = low
+
     def _eof_received(self, keep_open: bool) -> None:
         assert self._state is not None
         self._trace_logger.debug("_eof_received: removing reader")
@@ -736,6 +971,17 @@ class STARTTLSTransport(asyncio.Transport):
         Write data to the transport. This is an invalid operation if the stream
         is not writable, that is, if it is closed. During TLS negotiation, the
         data is buffered.
+
+        If no data is buffered, the transport tries to send the data right
+        away. Only data which could not be sent without blocking is buffered.
+
+        .. versionchanged:: 0.6
+
+            Data is sent right away instead of waiting for the next event loop
+            iteration if possible.
+
+        :class:`bytes` objects and read-only :class:`memoryview` objects are
+        queued without copying; other buffers are copied.
         """
         if not isinstance(data, (bytes, bytearray, memoryview)):
             raise TypeError('data argument must be byte-ish (%r)',
@@ -749,10 +995,123 @@ class STARTTLSTransport(asyncio.Transport):
         if not data:
             return
 
-        if not self._buffer:
+        if self._buffer or self._state.tls_handshaking:
+            # writer is already registered or the transport waits for the
+            # handshake to complete
+            self._buffer.append(data)
+            self._maybe_pause_protocol()
+            return
+
+        self._buffer.append(data)
+
+        if self._tls_read_wants_write or self._tls_write_wants_read:
+            self._loop.add_writer(self._raw_fd, self._write_ready)
+            self._maybe_pause_protocol()
+            return
+
+        # try to send right away and only wait for the socket to become
+        # writable if there is anything left
+        if not self._send_buffered():
+            return
+
+        if self._buffer and not self._tls_write_wants_read:
             self._loop.add_writer(self._raw_fd, self._write_ready)
+        self._maybe_pause_protocol()
+
+    def is_reading(self) -> bool:
+        """
+        Return true if the transport is receiving data.
+
+        .. versionadded:: 0.6
+        """
+        return (not self._paused and
+                self._state in (_State.RAW_OPEN,
+                                _State.TLS_HANDSHAKING,
+                                _State.TLS_OPEN))
+
+    def pause_reading(self) -> None:
+        """
+        Pause the receiving end of the transport.
+
+        No data will be passed to the protocol's
+        :meth:`~asyncio.Protocol.data_received` method until
+        :meth:`resume_reading` is called.
+
+        A TLS handshake or shutdown in progress continues while reading is
+        paused. Likewise, if sending data requires OpenSSL to read from the
+        socket first (e.g. during renegotiation), the socket is still watched
+        for that purpose.
+
+        .. versionadded:: 0.6
+        """
+        if self._paused or self._state in (None, _State.CLOSED):
+            return
+
+        self._paused = True
+        if (self._state in (_State.RAW_OPEN, _State.TLS_OPEN) and
+                not self._tls_write_wants_read):
+            self._trace_logger.debug("pause_reading: removing reader")
+            self._loop.remove_reader(self._raw_fd)
+
+    def resume_reading(self) -> None:
+        """
+        Resume the receiving end of the transport.
+
+        .. versionadded:: 0.6
+        """
+        if not self._paused:
+            return
+
+        self._paused = False
+        if (self._state in (_State.RAW_OPEN, _State.TLS_OPEN) and
+                not self._tls_read_wants_write):
+            self._trace_logger.debug("resume_reading: adding reader")
+            self._loop.add_reader(self._raw_fd, self._read_ready)
+            if self._tls_conn is not None and self._tls_conn.pending():
+                # decrypted data is waiting in OpenSSL, the socket may not
+                # become readable for it
+                self._loop.call_soon(self._read_ready)
+
+    def get_write_buffer_size(self) -> int:
+        """
+        Return the number of bytes in the write buffer.
+
+        This includes data written during the TLS handshake, which is only
+        sent after the handshake has completed.
+
+        .. versionadded:: 0.6
+        """
+        return len(self._buffer)
+
+    def get_write_buffer_limits(self) -> typing.Tuple[int, int]:
+        """
+        Return the ``(low, high)`` watermarks for write flow control.
 
-        self._buffer.extend(data)
+        .. versionadded:: 0.6
+        """
+        return (self._low_water, self._high_water)
+
+    def set_write_buffer_limits(
+            self,
+            high: typing.Optional[int] = None,
+            low: typing.Optional[int] = None,
+            ) -> None:
+        """
+        Set the high and low watermarks for write flow control.
+
+        If the write buffer grows above `high` bytes, the protocol's
+        :meth:`~asyncio.BaseProtocol.pause_writing` method is called. Once the
+        buffer has been drained to `low` bytes or less,
+        :meth:`~asyncio.BaseProtocol.resume_writing` is called.
+
+        If only one of the limits is given, the other is derived from it. If
+        neither is given, `high` defaults to :attr:`DEFAULT_HIGH_WATER` and
+        `low` to a quarter of `high`.
+
+        .. versionadded:: 0.6
+        """
+        self._set_write_buffer_limits(high=high, low=low)
+        self._maybe_pause_protocol()
 
     def write_eof(self) -> None:
         """
@@ -1,12 +1,117 @@
+import collections
+import socket
+import threading
 import typing
 
 import OpenSSL.SSL
 
 
+#: Maximum amount of plaintext carried by a single TLS record.
+TLS_RECORD_SIZE = 16384
+
+
+class _ReceiveBuffer(threading.local):
+    def __init__(self) -> None:
+        self.buffer = memoryview(bytearray())
+
+
+_receive_buffer = _ReceiveBuffer()
+
+
+def receive_buffer(size: int) -> memoryview:
+    """
+    Return a writable buffer of `size` bytes to receive data into.
+
+    The underlying memory is shared by all callers in the same thread and is
+    only reallocated if a larger buffer is requested. The contents must thus
+    be copied out before the buffer is requested again, i.e. before returning
+    control to the event loop.
+    """
+    buf = _receive_buffer.buffer
+    if len(buf) < size:
+        buf = memoryview(bytearray(size))
+        _receive_buffer.buffer = buf
+    return buf[:size]
+
+
+class RecvSizer:
+    """
+    Adapt the size of receive calls to the amount of data actually received.
+
+    :param minimum: The smallest size to use.
+    :param maximum: The largest size to use.
+    :param initial: The size to start with; defaults to `minimum`.
+
+    The current size is available as :attr:`size`. After each receive call,
+    :meth:`update` must be called with the number of bytes received. If a
+    receive filled the whole buffer, the size is doubled. If two receives in a
+    row used a quarter of the buffer or less, the size is halved.
+    """
+
+    def __init__(self,
+                 minimum: int,
+                 maximum: int,
+                 initial: typing.Optional[int] = None):
+        if not 0 < minimum <= maximum:
+            raise ValueError(
+                "minimum ({!r}) must be > 0 and <= maximum ({!r})".format(
+                    minimum, maximum,
+                )
+            )
+        self.minimum = minimum
+        self.maximum = maximum
+        if initial is None:
+            initial = minimum
+        self.size = min(max(initial, minimum), maximum)
+        self.__shrink_pending = False
+
+    def update(self, nbytes: int) -> None:
+        """
+        Record that a receive call returned `nbytes` bytes.
+        """
+        if nbytes >= self.size:
+            self.size = min(self.size * 2, self.maximum)
+            self.__shrink_pending = False
+        elif nbytes <= self.size // 4:
+            if self.__shrink_pending:
+                self.size = max(self.size // 2, self.minimum)
+                self.__shrink_pending = False
+            else:
+                self.__shrink_pending = True
+        else:
+            self.__shrink_pending = False
+
+
 class SendWrap:
-    def __init__(self, sock: OpenSSL.SSL.Connection):
+    """
+    Wrap a socket or :class:`OpenSSL.SSL.Connection` to provide the send
+    semantics required by OpenSSL.
+
+    :param sock: The socket to send data on.
+    :param max_size: Maximum number of bytes to pass to a single send call,
+        or :data:`None` for no limit.
+
+    If a send raises :class:`OpenSSL.SSL.WantReadError` or
+    :class:`OpenSSL.SSL.WantWriteError`, the next call to :meth:`send` must
+    pass the same buffer object. The exact bytes which were passed before are
+    then passed again to the socket.
+
+    Only the first `max_size` bytes of the buffer are copied and handed to the
+    socket. Setting `max_size` to a small multiple of :data:`TLS_RECORD_SIZE`
+    avoids copying a large backlog on each send, of which the socket would
+    only accept a few records anyway.
+
+    .. versionchanged:: 0.6
+
+        The `max_size` argument was added.
+    """
+
+    def __init__(self,
+                 sock: typing.Union[socket.socket, OpenSSL.SSL.Connection],
+                 max_size: typing.Optional[int] = None):
         self.__sock = sock
         self.__cached_write = None  # type: typing.Optional[typing.Tuple[bytes, typing.Any]]  # noqa
+        self.max_size = max_size
 
     def send(self, buf: typing.Union[bytes, memoryview]) -> int:
         if self.__cached_write is not None:
@@ -17,6 +122,8 @@ class SendWrap:
                     "different buffer object"
                 )
             self.__cached_write = None
+        elif self.max_size is not None and len(buf) > self.max_size:
+            as_bytes = bytes(memoryview(buf)[:self.max_size])
         else:
             as_bytes = bytes(buf)
 
@@ -25,3 +132,126 @@ class SendWrap:
         except (OpenSSL.SSL.WantWriteError, OpenSSL.SSL.WantReadError):
             self.__cached_write = as_bytes, buf
             raise
+
+
+class WriteQueue:
+    """
+    Queue of data waiting to be sent.
+
+    :param coalesce_size: Number of bytes up to which small chunks are joined
+        by :meth:`peek`.
+
+    The queue holds references to the chunks passed to :meth:`append` instead
+    of copying them into a contiguous buffer. Only mutable buffers (such as
+    :class:`bytearray`) are copied on :meth:`append`, because the caller may
+    modify them after handing them over.
+
+    Chunks are released as soon as they have been consumed completely.
+    """
+
+    def __init__(self, coalesce_size: int = TLS_RECORD_SIZE):
+        self.coalesce_size = coalesce_size
+        self.__chunks = collections.deque()  # type: typing.Deque[typing.Union[bytes, memoryview]]  # noqa
+        self.__offset = 0
+        self.__size = 0
+        self.__head = None  # type: typing.Optional[memoryview]
+
+    def __len__(self) -> int:
+        return self.__size
+
+    def __bool__(self) -> bool:
+        return self.__size > 0
+
+    def append(self, data: typing.Union[bytes, bytearray, memoryview]) -> None:
+        """
+        Enqueue `data` at the end of the queue.
+
+        :class:`bytes` objects and read-only, contiguous :class:`memoryview`
+        objects are enqueued without copying.
+        """
+        chunk = None  # type: typing.Optional[typing.Union[bytes, memoryview]]
+        if isinstance(data, bytes):
+            chunk = data
+        elif (isinstance(data, memoryview) and data.readonly and
+                data.c_contiguous):
+            chunk = data.cast("B")
+        else:
+            chunk = bytes(data)
+
+        if not chunk:
+            return
+
+        self.__chunks.append(chunk)
+        self.__size += len(chunk)
+
+    def peek(self) -> memoryview:
+        """
+        Return the data at the head of the queue.
+
+        If the head chunk is shorter than :attr:`coalesce_size` and more chunks
+        are queued, chunks are joined until :attr:`coalesce_size` bytes are
+        available, so that a single send can fill a TLS record.
+
+        The same object is returned on subsequent calls until :meth:`consume`
+        or :meth:`clear` is called. This allows to pass the same buffer to
+        :meth:`OpenSSL.SSL.Connection.send` when retrying after
+        :class:`OpenSSL.SSL.WantReadError` or
+        :class:`OpenSSL.SSL.WantWriteError`.
+
+        Calling :meth:`peek` on an empty queue raises :class:`IndexError`.
+        """
+        if self.__head is not None:
+            return self.__head
+
+        if not self.__chunks:
+            raise IndexError("peek from an empty WriteQueue")
+
+        head = self.__chunks[0]
+        avail = len(head) - self.__offset
+        if avail < self.coalesce_size and len(self.__chunks) > 1:
+            self.__chunks.popleft()
+            parts = [memoryview(head)[self.__offset:]]  # type: typing.List[typing.Union[bytes, memoryview]]  # noqa
+            while self.__chunks and avail < self.coalesce_size:
+                chunk = self.__chunks[0]
+                missing = self.coalesce_size - avail
+                if len(chunk) > missing:
+                    view = memoryview(chunk)
+                    parts.append(view[:missing])
+                    self.__chunks[0] = view[missing:]
+                    avail += missing
+                    break
+                parts.append(chunk)
+                avail += len(chunk)
+                self.__chunks.popleft()
+
+            head = b"".join(parts)
+            self.__chunks.appendleft(head)
+            self.__offset = 0
+
+        self.__head = memoryview(head)[self.__offset:]
+        return self.__head
+
+    def consume(self, nbytes: int) -> None:
+        """
+        Remove `nbytes` from the head of the queue.
+
+        Chunks which have been consumed completely are dropped from the queue.
+        """
+        if nbytes > self.__size:
+            raise ValueError("cannot consume more bytes than are queued")
+
+        self.__head = None
+        self.__size -= nbytes
+        offset = self.__offset + nbytes
+        while self.__chunks and offset >= len(self.__chunks[0]):
+            offset -= len(self.__chunks.popleft())
+        self.__offset = offset
+
+    def clear(self) -> None:
+        """
+        Drop all data from the queue.
+        """
+        self.__head = None
+        self.__chunks.clear()
+        self.__offset = 0
+        self.__size = 0
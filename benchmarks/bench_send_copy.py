@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Measure how many bytes :class:`aioopenssl.utils.SendWrap` copies per byte
+sent.
+
+A single large :class:`bytes` object is queued in a
+:class:`aioopenssl.utils.WriteQueue` and drained into a fake TLS connection
+which accepts ``--accept-records`` records per send, like a
+:class:`OpenSSL.SSL.Connection` on a busy socket would. Every byte handed to
+the fake connection in a buffer other than the one queued by the application
+counts as copied.
+
+The unbounded mode reproduces the previous behaviour of copying the whole
+pending buffer on every send.
+"""
+import argparse
+import time
+
+from aioopenssl.utils import SendWrap, WriteQueue, TLS_RECORD_SIZE
+
+
+class FakeConnection:
+    def __init__(self, accept_size):
+        self.accept_size = accept_size
+        self.sent = 0
+        self.copied = 0
+        self.original = None
+
+    def send(self, buf):
+        if buf is not self.original:
+            self.copied += len(buf)
+        n = min(len(buf), self.accept_size)
+        self.sent += n
+        return n
+
+
+def run(backlog, max_size, accept_records):
+    conn = FakeConnection(accept_records * TLS_RECORD_SIZE)
+    wrap = SendWrap(conn, max_size=max_size)
+    queue = WriteQueue()
+
+    data = bytes(backlog)
+    conn.original = data
+    queue.append(data)
+
+    t0 = time.perf_counter()
+    while queue:
+        queue.consume(wrap.send(queue.peek()))
+    elapsed = time.perf_counter() - t0
+
+    return conn.copied / conn.sent, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().split("\n")[0],
+    )
+    parser.add_argument("--backlog", type=int, default=16 * 1024 * 1024)
+    parser.add_argument("--accept-records", type=int, default=1)
+    parser.add_argument("--records", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    row = "{:>12}  {:>16}  {:>10}"
+    print(row.format("max_size", "copied per sent", "seconds"))
+    for records in args.records:
+        max_size = records * TLS_RECORD_SIZE
+        ratio, elapsed = run(args.backlog, max_size, args.accept_records)
+        print(row.format(max_size, "{:.3f}".format(ratio),
+                         "{:.3f}".format(elapsed)))
+
+    ratio, elapsed = run(args.backlog, None, args.accept_records)
+    print(row.format("unbounded", "{:.3f}".format(ratio),
+                     "{:.3f}".format(elapsed)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Measure the throughput of the transport write path for growing backlogs.
+
+A backlog of ``--chunk-size`` sized :class:`bytes` objects is queued and then
+drained through :class:`aioopenssl.utils.SendWrap` into a fake socket which
+accepts at most ``--send-size`` bytes per call, like a kernel socket buffer
+would. The same :class:`bytes` object is queued repeatedly, so large backlogs
+do not need a corresponding amount of memory.
+
+With ``--legacy``, the previous :class:`bytearray` based buffer is measured
+too, for comparison. That is quadratic in the backlog size, so it is limited
+to ``--legacy-max``.
+"""
+import argparse
+import time
+
+from aioopenssl.utils import SendWrap, WriteQueue
+
+
+class FakeSocket:
+    def __init__(self, send_size):
+        self.send_size = send_size
+        self.nbytes = 0
+
+    def send(self, buf):
+        n = min(len(buf), self.send_size)
+        self.nbytes += n
+        return n
+
+
+def run_queue(backlog, chunk, send_size):
+    sock = FakeSocket(send_size)
+    wrap = SendWrap(sock)
+    queue = WriteQueue()
+
+    t0 = time.perf_counter()
+    for _ in range(backlog // len(chunk)):
+        queue.append(chunk)
+    while queue:
+        queue.consume(wrap.send(queue.peek()))
+    return time.perf_counter() - t0
+
+
+def run_legacy(backlog, chunk, send_size):
+    sock = FakeSocket(send_size)
+    wrap = SendWrap(sock)
+    buffer = bytearray()
+
+    t0 = time.perf_counter()
+    for _ in range(backlog // len(chunk)):
+        buffer.extend(chunk)
+    while buffer:
+        del buffer[:wrap.send(buffer)]
+    return time.perf_counter() - t0
+
+
+def sizes(lo, hi):
+    size = lo
+    while size <= hi:
+        yield size
+        size *= 2
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().split("\n")[0],
+    )
+    parser.add_argument("--min", type=int, default=64 * 1024)
+    parser.add_argument("--max", type=int, default=512 * 1024 * 1024)
+    parser.add_argument("--chunk-size", type=int, default=64 * 1024)
+    parser.add_argument("--send-size", type=int, default=256 * 1024)
+    parser.add_argument("--legacy", action="store_true")
+    parser.add_argument("--legacy-max", type=int, default=32 * 1024 * 1024)
+    args = parser.parse_args()
+
+    chunk = bytes(args.chunk_size)
+    row = "{:>12}  {:>12}  {:>12}"
+    print(row.format("backlog", "queue MB/s", "legacy MB/s"))
+    for backlog in sizes(args.min, args.max):
+        elapsed = run_queue(backlog, chunk, args.send_size)
+        queue_rate = "{:.1f}".format(backlog / elapsed / 1e6)
+        legacy_rate = "-"
+        if args.legacy and backlog <= args.legacy_max:
+            elapsed = run_legacy(backlog, chunk, args.send_size)
+            legacy_rate = "{:.1f}".format(backlog / elapsed / 1e6)
+        print(row.format(backlog, queue_rate, legacy_rate))
+
+
+if __name__ == "__main__":
+    main()
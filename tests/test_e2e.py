@@ -236,6 +236,76 @@ class TestSSLConnection(unittest.TestCase):
             data2,
         )
 
+    @blocking
+    async def test_pause_and_resume_reading(self):
+        c_transport, c_reader, c_writer = await self._connect(
+            host="127.0.0.1",
+            port=PORT,
+            ssl_context_factory=lambda transport: OpenSSL.SSL.Context(
+                OpenSSL.SSL.SSLv23_METHOD
+            ),
+            server_hostname="localhost",
+            use_starttls=False,
+        )
+
+        s_reader, s_writer = await self.inbound_queue.get()
+
+        c_transport.pause_reading()
+        s_writer.write(b"fnord")
+        await s_writer.drain()
+
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(
+                c_reader.readexactly(5),
+                timeout=0.1,
+            )
+
+        c_transport.resume_reading()
+        c_read = await c_reader.readexactly(5)
+
+        self.assertEqual(c_read, b"fnord")
+
+    @unittest.skipUnless(hasattr(asyncio, "BufferedProtocol"),
+                         "asyncio.BufferedProtocol not available")
+    @blocking
+    async def test_buffered_protocol(self):
+        received = bytearray()
+        done = asyncio.Event()
+
+        class Protocol(asyncio.BufferedProtocol):
+            def __init__(self):
+                self.buffer = bytearray(1024)
+
+            def get_buffer(self, sizehint):
+                return self.buffer
+
+            def buffer_updated(self, nbytes):
+                received.extend(self.buffer[:nbytes])
+                if len(received) >= 2**17:
+                    done.set()
+
+        c_transport, _ = await aioopenssl.create_starttls_connection(
+            asyncio.get_event_loop(),
+            Protocol,
+            host="127.0.0.1",
+            port=PORT,
+            ssl_context_factory=lambda transport: OpenSSL.SSL.Context(
+                OpenSSL.SSL.SSLv23_METHOD
+            ),
+            server_hostname="localhost",
+            use_starttls=False,
+        )
+
+        s_reader, s_writer = await self.inbound_queue.get()
+
+        data = bytes(range(256)) * 512
+        s_writer.write(data)
+        await s_writer.drain()
+        await done.wait()
+
+        self.assertEqual(received, data)
+        c_transport.close()
+
     @blocking
     async def test_abort(self):
         c_transport, c_reader, c_writer = await self._connect(
@@ -817,3 +887,85 @@ class TestSSLConnectionThreadServer(unittest.TestCase):
         c_transport.close()
         await asyncio.sleep(0.1)
         sock.close()
+
+    async def _connect_recording(self, **kwargs):
+        chunks = []
+
+        class Protocol(asyncio.Protocol):
+            def data_received(self, data):
+                chunks.append(data)
+
+        transport, _ = await aioopenssl.create_starttls_connection(
+            asyncio.get_event_loop(),
+            Protocol,
+            host="127.0.0.1",
+            port=PORT+1,
+            ssl_context_factory=lambda transport: OpenSSL.SSL.Context(
+                OpenSSL.SSL.SSLv23_METHOD
+            ),
+            server_hostname="localhost",
+            use_starttls=False,
+            **kwargs
+        )
+        return transport, chunks
+
+    async def _send_records_while_paused(self, transport, sock, records):
+        transport.pause_reading()
+        for record in records:
+            await self.send_thread(sock, record)
+        await asyncio.sleep(0.1)
+        transport.resume_reading()
+        await asyncio.sleep(0.1)
+
+    @blocking
+    async def test_reads_all_records_in_one_wakeup(self):
+        c_transport, chunks = await self._connect_recording()
+        sock = await self._get_inbound()
+
+        records = [b"foo", b"bar", b"baz"]
+        with unittest.mock.patch.object(
+                c_transport, "_read_ready",
+                wraps=c_transport._read_ready) as read_ready:
+            await self._send_records_while_paused(c_transport, sock, records)
+
+        self.assertEqual(chunks, records)
+        self.assertEqual(read_ready.call_count, 1)
+
+        c_transport.close()
+        await asyncio.sleep(0.1)
+        sock.close()
+
+    @blocking
+    async def test_coalesce_reads(self):
+        c_transport, chunks = await self._connect_recording(
+            coalesce_reads=True,
+        )
+        sock = await self._get_inbound()
+
+        await self._send_records_while_paused(
+            c_transport, sock, [b"foo", b"bar", b"baz"],
+        )
+
+        self.assertEqual(chunks, [b"foobarbaz"])
+
+        c_transport.close()
+        await asyncio.sleep(0.1)
+        sock.close()
+
+    @blocking
+    async def test_read_budget_calls_limits_reads_per_wakeup(self):
+        c_transport, chunks = await self._connect_recording(
+            read_budget_calls=1,
+            coalesce_reads=True,
+        )
+        sock = await self._get_inbound()
+
+        await self._send_records_while_paused(
+            c_transport, sock, [b"foo", b"bar", b"baz"],
+        )
+
+        self.assertEqual(chunks, [b"foo", b"bar", b"baz"])
+
+        c_transport.close()
+        await asyncio.sleep(0.1)
+        sock.close()
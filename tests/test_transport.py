@@ -0,0 +1,268 @@
+import asyncio
+import socket
+import unittest
+import unittest.mock
+
+import aioopenssl
+
+
+def run_coroutine(coro, timeout=1):
+    loop = asyncio.get_event_loop()
+    return loop.run_until_complete(asyncio.wait_for(coro, timeout))
+
+
+class TestRawTransport(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.sock, self.peer = socket.socketpair()
+        self.sock.setblocking(False)
+        self.peer.setblocking(False)
+        self.protocol = unittest.mock.Mock(spec=asyncio.Protocol)
+        self.protocol.eof_received.return_value = False
+        self.transport = aioopenssl.STARTTLSTransport(
+            self.loop,
+            self.sock,
+            self.protocol,
+            ssl_context_factory=None,
+            use_starttls=True,
+        )
+        self.peer_recv = bytearray()
+        run_coroutine(asyncio.sleep(0))
+
+    def tearDown(self):
+        if not self.transport.is_closing():
+            self.transport.abort()
+        run_coroutine(asyncio.sleep(0))
+        self.peer.close()
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def _drain_peer(self):
+        while True:
+            try:
+                data = self.peer.recv(65536)
+            except BlockingIOError:
+                return
+            if not data:
+                return
+            self.peer_recv.extend(data)
+
+    def test_write_sends_immediately(self):
+        with unittest.mock.patch.object(self.loop, "add_writer") as add_writer:
+            self.transport.write(b"foobar")
+
+        add_writer.assert_not_called()
+        self._drain_peer()
+        self.assertEqual(self.peer_recv, b"foobar")
+
+    def test_write_registers_writer_for_remainder(self):
+        data = bytes(16 * 1024 * 1024)
+        with unittest.mock.patch.object(self.loop, "add_writer") as add_writer:
+            self.transport.write(data)
+
+        add_writer.assert_called_once_with(
+            self.sock.fileno(),
+            self.transport._write_ready,
+        )
+
+    def test_buffered_remainder_is_sent_by_writer(self):
+        data = bytes(range(256)) * 16384
+        self.transport.write(data)
+
+        async def drain():
+            while len(self.peer_recv) < len(data):
+                await asyncio.sleep(0.001)
+                self._drain_peer()
+
+        run_coroutine(drain())
+        self.assertEqual(self.peer_recv, data)
+
+    def test_default_write_buffer_limits(self):
+        self.assertEqual(
+            self.transport.get_write_buffer_limits(),
+            (16 * 1024, 64 * 1024),
+        )
+
+    def test_set_write_buffer_limits_derives_missing_limit(self):
+        self.transport.set_write_buffer_limits(high=1000)
+        self.assertEqual(self.transport.get_write_buffer_limits(),
+                         (250, 1000))
+        self.transport.set_write_buffer_limits(low=100)
+        self.assertEqual(self.transport.get_write_buffer_limits(),
+                         (100, 400))
+
+    def test_set_write_buffer_limits_rejects_invalid_limits(self):
+        with self.assertRaises(ValueError):
+            self.transport.set_write_buffer_limits(high=10, low=20)
+
+    def test_write_pauses_and_resumes_protocol(self):
+        self.transport.set_write_buffer_limits(high=1024)
+        data = bytes(16 * 1024 * 1024)
+        self.transport.write(data)
+
+        self.assertGreater(self.transport.get_write_buffer_size(), 1024)
+        self.protocol.pause_writing.assert_called_once_with()
+        self.protocol.resume_writing.assert_not_called()
+
+        self.transport.write(b"foo")
+        self.protocol.pause_writing.assert_called_once_with()
+
+        async def drain():
+            while self.transport.get_write_buffer_size() > 256:
+                await asyncio.sleep(0.001)
+                self._drain_peer()
+
+        run_coroutine(drain(), timeout=5)
+        self.protocol.resume_writing.assert_called_once_with()
+
+    def test_small_write_does_not_pause_protocol(self):
+        self.transport.write(b"foobar")
+        self.assertEqual(self.transport.get_write_buffer_size(), 0)
+        self.protocol.pause_writing.assert_not_called()
+
+    def test_is_reading(self):
+        self.assertTrue(self.transport.is_reading())
+        self.transport.pause_reading()
+        self.assertFalse(self.transport.is_reading())
+        self.transport.resume_reading()
+        self.assertTrue(self.transport.is_reading())
+
+    def test_pause_reading_stops_data_received(self):
+        self.transport.pause_reading()
+        self.peer.send(b"foobar")
+        run_coroutine(asyncio.sleep(0.01))
+        self.protocol.data_received.assert_not_called()
+
+        self.transport.resume_reading()
+        run_coroutine(asyncio.sleep(0.01))
+        self.protocol.data_received.assert_called_once_with(b"foobar")
+
+    def test_pause_and_resume_are_idempotent(self):
+        self.transport.pause_reading()
+        self.transport.pause_reading()
+        self.transport.resume_reading()
+        self.transport.resume_reading()
+        self.peer.send(b"foobar")
+        run_coroutine(asyncio.sleep(0.01))
+        self.protocol.data_received.assert_called_once_with(b"foobar")
+
+    def test_write_works_while_reading_is_paused(self):
+        self.transport.pause_reading()
+        self.transport.write(b"foobar")
+        self._drain_peer()
+        self.assertEqual(self.peer_recv, b"foobar")
+
+    def test_recv_size_adapts_to_received_data(self):
+        sizer = self.transport._recv_sizer
+        initial = sizer.size
+        for i in range(4):
+            self.peer.send(b"foo")
+            run_coroutine(asyncio.sleep(0.01))
+        self.assertLess(sizer.size, initial)
+
+        run_coroutine(self.loop.sock_sendall(self.peer, bytes(1024 * 1024)))
+        run_coroutine(asyncio.sleep(0.01))
+        self.assertGreater(sizer.size, initial)
+
+    def test_data_received_gets_copy_of_received_bytes(self):
+        self.peer.send(b"foo")
+        run_coroutine(asyncio.sleep(0.01))
+        self.peer.send(b"barbaz")
+        run_coroutine(asyncio.sleep(0.01))
+
+        self.assertSequenceEqual(
+            self.protocol.data_received.mock_calls,
+            [
+                unittest.mock.call(b"foo"),
+                unittest.mock.call(b"barbaz"),
+            ]
+        )
+        for (data,), _ in self.protocol.data_received.call_args_list:
+            self.assertIsInstance(data, bytes)
+
+
+class BufferedProtocol(getattr(asyncio, "BufferedProtocol", object)):
+    def __init__(self):
+        self.buffer = bytearray(4)
+        self.received = bytearray()
+        self.sizehints = []
+        self.eof = False
+
+    def connection_made(self, transport):
+        pass
+
+    def connection_lost(self, exc):
+        pass
+
+    def get_buffer(self, sizehint):
+        self.sizehints.append(sizehint)
+        return self.buffer
+
+    def buffer_updated(self, nbytes):
+        self.received.extend(self.buffer[:nbytes])
+
+    def eof_received(self):
+        self.eof = True
+
+
+@unittest.skipUnless(hasattr(asyncio, "BufferedProtocol"),
+                     "asyncio.BufferedProtocol not available")
+class TestRawTransportBufferedProtocol(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.sock, self.peer = socket.socketpair()
+        self.sock.setblocking(False)
+        self.protocol = BufferedProtocol()
+        self.transport = aioopenssl.STARTTLSTransport(
+            self.loop,
+            self.sock,
+            self.protocol,
+            ssl_context_factory=None,
+            use_starttls=True,
+        )
+        run_coroutine(asyncio.sleep(0))
+
+    def tearDown(self):
+        if not self.transport.is_closing():
+            self.transport.abort()
+        run_coroutine(asyncio.sleep(0))
+        self.peer.close()
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def test_receives_into_protocol_buffer(self):
+        self.peer.send(b"foobarbaz")
+
+        async def wait():
+            while len(self.protocol.received) < 9:
+                await asyncio.sleep(0.001)
+
+        run_coroutine(wait())
+        self.assertEqual(self.protocol.received, b"foobarbaz")
+        self.assertEqual(
+            self.protocol.sizehints[0],
+            aioopenssl.STARTTLSTransport.INITIAL_RECV_SIZE,
+        )
+
+    def test_eof(self):
+        self.peer.shutdown(socket.SHUT_WR)
+
+        async def wait():
+            while not self.protocol.eof:
+                await asyncio.sleep(0.001)
+
+        run_coroutine(wait())
+
+    def test_empty_buffer_is_fatal(self):
+        self.protocol.buffer = bytearray()
+        exc_handler = unittest.mock.Mock()
+        self.loop.set_exception_handler(exc_handler)
+        self.peer.send(b"foo")
+        run_coroutine(asyncio.sleep(0.01))
+
+        exc_handler.assert_called_once_with(self.loop, unittest.mock.ANY)
+        _, ctx = exc_handler.call_args[0]
+        self.assertIsInstance(ctx["exception"], RuntimeError)
+        self.assertTrue(self.transport.is_closing())
@@ -1,6 +1,8 @@
+import array
 import contextlib
 import unittest
 import unittest.mock
+import weakref
 
 import OpenSSL.SSL
 
@@ -345,3 +347,207 @@ class TestSendWrap(unittest.TestCase):
 
         self.assertEqual(result1, unittest.mock.sentinel.send_result1)
         self.assertEqual(result2, unittest.mock.sentinel.send_result2)
+
+
+class TestWriteQueue(unittest.TestCase):
+    def setUp(self):
+        self.q = utils.WriteQueue(coalesce_size=8)
+
+    def test_empty(self):
+        self.assertFalse(self.q)
+        self.assertEqual(len(self.q), 0)
+        with self.assertRaises(IndexError):
+            self.q.peek()
+
+    def test_append_keeps_bytes_without_copy(self):
+        data = b"x" * 32
+        self.q.append(data)
+        self.assertEqual(len(self.q), 32)
+        head = self.q.peek()
+        self.assertIs(head.obj, data)
+
+    def test_append_keeps_readonly_memoryview_without_copy(self):
+        data = b"x" * 32
+        self.q.append(memoryview(data))
+        self.assertIs(self.q.peek().obj, data)
+
+    def test_append_copies_mutable_buffers(self):
+        data = bytearray(b"foobarbaz")
+        self.q.append(data)
+        data[:] = b"xxxxxxxxx"
+        self.assertEqual(bytes(self.q.peek()), b"foobarbaz")
+
+        view_src = bytearray(b"fnordfnord")
+        self.q.clear()
+        self.q.append(memoryview(view_src))
+        view_src[:] = b"xxxxxxxxxx"
+        self.assertEqual(bytes(self.q.peek()), b"fnordfnord")
+
+    def test_append_ignores_empty_data(self):
+        self.q.append(b"")
+        self.q.append(bytearray())
+        self.assertFalse(self.q)
+
+    def test_peek_returns_same_object_until_consume(self):
+        self.q.append(b"foo")
+        self.q.append(b"bar")
+        head = self.q.peek()
+        self.q.append(b"baz")
+        self.assertIs(self.q.peek(), head)
+        self.q.consume(1)
+        self.assertIsNot(self.q.peek(), head)
+
+    def test_peek_coalesces_small_chunks_up_to_coalesce_size(self):
+        self.q.append(b"foo")
+        self.q.append(b"bar")
+        self.q.append(b"bazfnord")
+        self.assertEqual(bytes(self.q.peek()), b"foobarba")
+        self.assertEqual(len(self.q), 14)
+        self.q.consume(8)
+        self.assertEqual(bytes(self.q.peek()), b"zfnord")
+        self.assertEqual(len(self.q), 6)
+
+    def test_peek_does_not_join_large_head(self):
+        data = b"x" * 16
+        self.q.append(data)
+        self.q.append(b"foo")
+        self.assertIs(self.q.peek().obj, data)
+        self.assertEqual(len(self.q.peek()), 16)
+
+    def test_consume_partial_and_across_chunks(self):
+        self.q.append(b"x" * 10)
+        self.q.append(b"y" * 10)
+        self.q.consume(1)
+        self.assertEqual(bytes(self.q.peek()), b"x" * 9)
+        self.q.consume(6)
+        self.assertEqual(bytes(self.q.peek()), b"xxxyyyyy")
+        self.q.consume(8)
+        self.assertEqual(bytes(self.q.peek()), b"yyyyy")
+        self.q.consume(5)
+        self.assertFalse(self.q)
+
+    def test_consume_rejects_more_than_queued(self):
+        self.q.append(b"foo")
+        with self.assertRaises(ValueError):
+            self.q.consume(4)
+
+    @unittest.skipUnless(hasattr(memoryview, "toreadonly"),
+                         "memoryview.toreadonly() not available")
+    def test_consume_releases_sent_chunks(self):
+        chunk = array.array("B", b"x" * 16)
+        ref = weakref.ref(chunk)
+        self.q.append(memoryview(chunk).toreadonly())
+        del chunk
+        self.q.consume(len(self.q.peek()))
+        self.assertIsNone(ref())
+
+    def test_clear(self):
+        self.q.append(b"foo")
+        self.q.peek()
+        self.q.clear()
+        self.assertFalse(self.q)
+        with self.assertRaises(IndexError):
+            self.q.peek()
+
+
+class TestSendWrapMaxSize(unittest.TestCase):
+    def setUp(self):
+        self.sock = unittest.mock.Mock(["send"])
+        self.sock.send.side_effect = lambda x: len(x)
+        self.ww = utils.SendWrap(self.sock, max_size=4)
+
+    def test_passes_at_most_max_size_bytes(self):
+        result = self.ww.send(b"foobarbaz")
+        self.sock.send.assert_called_once_with(b"foob")
+        self.assertEqual(result, 4)
+
+    def test_passes_short_bytes_without_copy(self):
+        data = b"foo"
+        self.ww.send(data)
+        (arg,), _ = self.sock.send.call_args
+        self.assertIs(arg, data)
+
+    def test_slices_memoryview(self):
+        self.ww.send(memoryview(b"foobarbaz")[3:])
+        self.sock.send.assert_called_once_with(b"barb")
+
+    def test_retry_passes_same_slice(self):
+        data = memoryview(b"foobarbaz")
+        self.sock.send.side_effect = OpenSSL.SSL.WantWriteError
+
+        with self.assertRaises(OpenSSL.SSL.WantWriteError):
+            self.ww.send(data)
+
+        (first,), _ = self.sock.send.call_args
+        self.sock.send.reset_mock()
+        self.sock.send.side_effect = None
+        self.sock.send.return_value = 4
+
+        self.assertEqual(self.ww.send(data), 4)
+        (second,), _ = self.sock.send.call_args
+        self.assertIs(first, second)
+
+
+class TestReceiveBuffer(unittest.TestCase):
+    def test_returns_writable_buffer_of_requested_size(self):
+        buf = utils.receive_buffer(16)
+        self.assertEqual(len(buf), 16)
+        self.assertFalse(buf.readonly)
+
+    def test_reuses_memory(self):
+        buf1 = utils.receive_buffer(32)
+        buf2 = utils.receive_buffer(16)
+        self.assertIs(buf1.obj, buf2.obj)
+
+    def test_grows_for_larger_requests(self):
+        utils.receive_buffer(16)
+        size = len(utils.receive_buffer(16).obj) + 1
+        buf = utils.receive_buffer(size)
+        self.assertEqual(len(buf), size)
+
+
+class TestRecvSizer(unittest.TestCase):
+    def test_initial_defaults_to_minimum(self):
+        sizer = utils.RecvSizer(1024, 8192)
+        self.assertEqual(sizer.size, 1024)
+
+    def test_initial_is_clamped(self):
+        self.assertEqual(utils.RecvSizer(1024, 8192, initial=16384).size,
+                         8192)
+        self.assertEqual(utils.RecvSizer(1024, 8192, initial=16).size,
+                         1024)
+
+    def test_rejects_invalid_bounds(self):
+        with self.assertRaises(ValueError):
+            utils.RecvSizer(0, 1024)
+        with self.assertRaises(ValueError):
+            utils.RecvSizer(2048, 1024)
+
+    def test_grows_when_buffer_is_filled(self):
+        sizer = utils.RecvSizer(1024, 4096)
+        sizer.update(1024)
+        self.assertEqual(sizer.size, 2048)
+        sizer.update(2048)
+        self.assertEqual(sizer.size, 4096)
+        sizer.update(4096)
+        self.assertEqual(sizer.size, 4096)
+
+    def test_shrinks_after_two_small_reads(self):
+        sizer = utils.RecvSizer(1024, 8192, initial=8192)
+        sizer.update(100)
+        self.assertEqual(sizer.size, 8192)
+        sizer.update(100)
+        self.assertEqual(sizer.size, 4096)
+        sizer.update(100)
+        sizer.update(100)
+        self.assertEqual(sizer.size, 2048)
+        for i in range(10):
+            sizer.update(1)
+        self.assertEqual(sizer.size, 1024)
+
+    def test_medium_read_resets_shrinking(self):
+        sizer = utils.RecvSizer(1024, 8192, initial=8192)
+        sizer.update(100)
+        sizer.update(4096)
+        sizer.update(100)
+        self.assertEqual(sizer.size, 8192)